@@ -1,7 +1,9 @@
 """
 Provides functions that are useful across all model architectures.
 """
+import atexit
 import datetime
+import functools
 import os
 import numpy as np
 import tensorflow as tf
@@ -9,17 +11,35 @@ import matplotlib.pyplot as plt
 from tfdiffeq import odeint
 from MassSpringDamper import MassSpringDamper
 
+# Figures reused by visualize across epochs, keyed by PLOT_DIR
+_figures = {}
+# Results files written by visualize, keyed by path
+_csv_handles = {}
+RESULTS_TITLE = ("wall_time,epoch,energy_drift_interp,energy_drift_extrap, phase_error_interp,"
+                 + "phase_error_extrap, traj_err_interp, traj_err_extrap\n")
+
 class Lambda(tf.keras.Model):
+    """Reference dynamics of the mass-spring-damper, written as dy = y @ A."""
+
+    def __init__(self, m=1., c=1., d=0.):
+        # dtype is pinned to match the input_signature of call, even if floatx is float64
+        super(Lambda, self).__init__(dtype='float32')
+        self.A = tf.constant([[0., -c/m],
+                              [1., -d/m]], dtype=tf.float32)
 
+    @tf.function(experimental_compile=True,
+                 input_signature=[tf.TensorSpec([], tf.float32),
+                                  tf.TensorSpec([None, 2], tf.float32)])
     def call(self, t, y):
-        m = 1.
-        c = 1.
-        d = 0.
-        return tf.stack([y[:, 1], -(d*y[:, 1]+c*y[:, 0]) / m], axis=-1)
+        return tf.matmul(y, self.A)
 
 
 class modelFunc(tf.keras.Model):
-    """Converts a standard tf.keras.Model to a model compatible with odeint."""
+    """Converts a standard tf.keras.Model to a model compatible with odeint.
+    call is deliberately not a tf.function with a fixed input_signature: the wrapped
+    models may be dynamic (see ODEFunc in odenet.py), latent_ode.py may run in float64,
+    and the LSTMs are called with (batch, time, 2) inputs rather than (batch, 2).
+    Lambda can use a float32 signature only because its dtype is pinned to float32."""
 
     def __init__(self, model):
         super(modelFunc, self).__init__()
@@ -48,13 +68,18 @@ class RunningAverageMeter():
         self.val = val
 
 
-def create_dataset(n_series=51, samples_per_series=1001, save_to_disk=True):
+def create_dataset(n_series=51, samples_per_series=1001, save_to_disk=True, dtype=np.float32):
     """Creates a dataset with n_series data series that are each simulated for samples_per_series
     time steps. The timesteps are delta_t seconds apart.
     # Arguments:
         n_series: int, number of series to create
         samples_per_series: int, number of samples per series
         save_dataset: bool, whether to save the dataset to disk
+        dtype: numpy dtype of x_train and x_val, e.g. np.float16 to halve their size.
+               y_train and y_val are always stored as float32. Only densenet.py and
+               odenet.py (without --synthetic_derivative) take their targets from y_*;
+               lstm.py, lstm_mdn.py and latent_ode.py build their targets from x_train
+               and x_val, so float16 would quantize their targets too. (default: np.float32)
     # Returns:
         x_train: np.ndarray, shape=(n_series, samples_per_series, 2)
         y_train: np.ndarray, shape=(n_series, samples_per_series, 2)
@@ -67,24 +92,23 @@ def create_dataset(n_series=51, samples_per_series=1001, save_to_disk=True):
     x0_out = np.random.random((n_series-n_series//2)) + np.pi - 1
     x0 = np.concatenate([x0_in, x0_out])
     msd = MassSpringDamper(x=x0, x_dt=tf.zeros_like(x0))  # compute all trajectories at once
+    # Trajectories stay on the device as (n_series, samples_per_series, 2) float32
+    # tensors and are copied to the host exactly once each.
     with tf.device('/gpu:0'):
         x_train = msd.step(dt=(samples_per_series-1)*delta_t, n_steps=samples_per_series)
-        y_train = np.array(msd.call(0., x_train))
-    x_train = np.transpose(x_train, [1, 0, 2])
-    y_train = np.transpose(y_train, [1, 0, 2])
+        y_train = msd.call(0., x_train)
+        x_train = tf.cast(tf.transpose(x_train, [1, 0, 2]), tf.float32).numpy()
+        y_train = tf.cast(tf.transpose(y_train, [1, 0, 2]), tf.float32).numpy()
 
-    x_val = []
-    y_val = []
-    msd = MassSpringDamper(x=5., x_dt=0.5)
-    with tf.device('/gpu:0'):
-        x_val.append(msd.step(dt=(samples_per_series-1)*delta_t, n_steps=samples_per_series))
-        y_val.append(np.array(msd.call(0., x_val[-1])))
-    msd = MassSpringDamper(x=1.5, x_dt=0.5)
+    # Extrapolation and interpolation series are integrated together as one batch
+    msd = MassSpringDamper(x=tf.constant([5., 1.5]), x_dt=tf.constant([0.5, 0.5]))
     with tf.device('/gpu:0'):
-        x_val.append(msd.step(dt=(samples_per_series-1)*delta_t, n_steps=samples_per_series))
-        y_val.append(np.array(msd.call(0., x_val[-1])))
-    x_val = np.stack(x_val)
-    y_val = np.stack(y_val)
+        x_val = msd.step(dt=(samples_per_series-1)*delta_t, n_steps=samples_per_series)
+        y_val = msd.call(0., x_val)
+        x_val = tf.transpose(x_val, [1, 0, 2]).numpy()
+        y_val = tf.transpose(y_val, [1, 0, 2]).numpy()
+    x_train = x_train.astype(dtype, copy=False)
+    x_val = x_val.astype(dtype, copy=False)
 
     if save_to_disk:
         np.save('experiments/datasets/mass_spring_damper_x_train.npy', x_train)
@@ -94,11 +118,27 @@ def create_dataset(n_series=51, samples_per_series=1001, save_to_disk=True):
     return x_train, y_train, x_val, y_val
 
 
+def _load_mmap(path):
+    """Memory-maps a .npy file. Only arrays that are neither float16 nor float32
+    on disk are copied, and converted to float32."""
+    data = np.load(path, mmap_mode='r')
+    if data.dtype not in (np.float16, np.float32):
+        data = data.astype(np.float32)
+    return data
+
+
 def load_dataset():
-    x_train = np.load('experiments/datasets/mass_spring_damper_x_train.npy').astype(np.float32)
-    y_train = np.load('experiments/datasets/mass_spring_damper_y_train.npy').astype(np.float32)
-    x_val = np.load('experiments/datasets/mass_spring_damper_x_val.npy').astype(np.float32)
-    y_val = np.load('experiments/datasets/mass_spring_damper_y_val.npy').astype(np.float32)
+    """Loads the dataset written by create_dataset.
+    Arrays stored as float16 or float32 are returned as read-only memory maps in
+    their on-disk dtype; use np.array(arr) where a writable copy is needed.
+    Keras layers cast float16 inputs to their own dtype when they are fed.
+    # Returns:
+        x_train, y_train, x_val, y_val: np.ndarray, dtype=float16 or float32
+    """
+    x_train = _load_mmap('experiments/datasets/mass_spring_damper_x_train.npy')
+    y_train = _load_mmap('experiments/datasets/mass_spring_damper_y_train.npy')
+    x_val = _load_mmap('experiments/datasets/mass_spring_damper_x_val.npy')
+    y_val = _load_mmap('experiments/datasets/mass_spring_damper_y_val.npy')
     return x_train, y_train, x_val, y_val
 
 
@@ -114,7 +154,9 @@ def my_mse(y_true, y_pred):
 
 def total_energy(state, k=1, m=1):
     """Calculates total energy of a mass-spring-damper system given a state."""
-    return 0.5*k*state[..., 0]*state[..., 0]+0.5*m*state[..., 1]*state[..., 1]
+    state = np.asarray(state)
+    w = np.array([0.5*k, 0.5*m], dtype=np.result_type(state.dtype, np.float32))
+    return np.einsum('...i,i,...i->...', state, w, state)
 
 
 def relative_energy_drift(x_pred, x_true, t=-1):
@@ -151,6 +193,151 @@ def trajectory_error(x_pred, x_val):
     return np.mean(np.abs(x_pred - x_val))
 
 
+def lstm_rollout(x0, kernel, recurrent_kernel, bias, dense_kernel, dense_bias, n_steps):
+    """Autoregressively rolls out an LSTM followed by a Dense layer, starting from x0.
+    Written with plain NumPy operations so that it can be compiled with numba.
+    # Arguments:
+        x0: np.ndarray, shape=(2,) - initial state
+        kernel, recurrent_kernel, bias: LSTM weights as returned by get_weights()
+        dense_kernel, dense_bias: Dense weights as returned by get_weights()
+        n_steps: int, length of the returned time series
+    # Returns:
+        x_t: np.ndarray, shape=(n_steps, 2), dtype=float64
+    """
+    # Everything is computed in float64: numba types the float literals below as
+    # float64, and mixing them with float32 arrays would change the type of h and c.
+    kernel = kernel.astype(np.float64)
+    recurrent_kernel = recurrent_kernel.astype(np.float64)
+    bias = bias.astype(np.float64)
+    dense_kernel = dense_kernel.astype(np.float64)
+    dense_bias = dense_bias.astype(np.float64)
+    units = recurrent_kernel.shape[0]
+    x_t = np.zeros((n_steps, x0.shape[0]), dtype=np.float64)
+    x_t[0] = x0
+    h = np.zeros(units, dtype=np.float64)
+    c = np.zeros(units, dtype=np.float64)
+    for i in range(1, n_steps):
+        z = np.dot(x_t[i-1], kernel) + np.dot(h, recurrent_kernel) + bias
+        # Keras gate order: input, forget, cell, output
+        i_gate = 1. / (1. + np.exp(-z[:units]))
+        f_gate = 1. / (1. + np.exp(-z[units:2*units]))
+        c_cand = np.tanh(z[2*units:3*units])
+        o_gate = 1. / (1. + np.exp(-z[3*units:]))
+        c = f_gate * c + i_gate * c_cand
+        h = o_gate * np.tanh(c)
+        x_t[i] = np.dot(h, dense_kernel) + dense_bias
+    return x_t
+
+
+@functools.lru_cache(maxsize=1)
+def _parse_run_time(TIME_OF_RUN):
+    return datetime.datetime.strptime(TIME_OF_RUN, "%Y%m%d-%H%M%S")
+
+
+@functools.lru_cache(maxsize=1)
+def _visualization_grids(dt, steps):
+    """Creates the time grid and the vector-field grid used by visualize.
+    They are the same every epoch, so the flattened grid is kept on the device
+    as a tf.Variable instead of being copied over on every call.
+    # Returns:
+        t: tf.Tensor, shape=(int(10./dt)+1,)
+        x, y: np.ndarray, shape=(steps, steps) - meshgrid for plotting
+        grid: np.ndarray, shape=(steps*steps, 2), dtype=float32
+        grid_var: tf.Variable holding grid
+    """
+    t = tf.linspace(0., 10., int(10./dt)+1)
+    y, x = np.mgrid[-6:6:complex(0, steps), -6:6:complex(0, steps)]
+    grid = np.stack([x, y], -1).reshape(steps * steps, 2).astype(np.float32)
+    with tf.device('/gpu:0'):
+        grid_var = tf.Variable(grid, trainable=False)
+    return t, x, y, grid, grid_var
+
+
+@functools.lru_cache(maxsize=1)
+def _reference_field(dt, steps):
+    """Evaluates the true dynamics on the vector-field grid of visualize.
+    The result does not depend on the model, so it is computed only once.
+    # Returns:
+        dydt_ref: np.ndarray, shape=(steps, steps, 2)
+        mag_ref: np.ndarray, shape=(steps, steps) - magnitude of dydt_ref, offset by 1e-8
+    """
+    grid_var = _visualization_grids(dt, steps)[-1]
+    dydt_ref = Lambda()(0., grid_var).numpy()
+    mag_ref = 1e-8+np.hypot(dydt_ref[:, 0], dydt_ref[:, 1]).reshape(steps, steps)
+    return dydt_ref.reshape(steps, steps, 2), mag_ref
+
+
+def _get_csv_handle(file_path):
+    """Returns a line-buffered append handle for file_path, opened once per run.
+    The title row is only written if this call created the file, so the header
+    check costs one open() per run and none on later epochs."""
+    if file_path not in _csv_handles:
+        try:
+            fd = os.open(file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL)
+            created = True
+        except FileExistsError:
+            fd = os.open(file_path, os.O_WRONLY | os.O_APPEND)
+            created = False
+        handle = os.fdopen(fd, 'a', buffering=1)
+        if created:
+            handle.write(RESULTS_TITLE)
+        atexit.register(handle.close)
+        _csv_handles[file_path] = handle
+    return _csv_handles[file_path]
+
+
+@functools.lru_cache(maxsize=1)
+def _jitted_lstm_rollout():
+    """Compiles lstm_rollout with numba on first use, so numba stays an optional dependency."""
+    from numba import njit
+    return njit(cache=True, fastmath=True)(lstm_rollout)
+
+
+def _format_axis(ax, title, xlabel, ylabel=None, xlim=(-6, 6), ylim=(-6, 6)):
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    if ylabel is not None:
+        ax.set_ylabel(ylabel)
+    if xlim is not None:
+        ax.set_xlim(*xlim)
+    if ylim is not None:
+        ax.set_ylim(*ylim)
+
+
+def _get_figure(PLOT_DIR):
+    """Returns the figure used by visualize for PLOT_DIR, creating it on the first call.
+    Reusing the figure avoids reallocating all six subplots and colorbars every epoch.
+    # Returns:
+        fig: matplotlib.figure.Figure
+        axes: dict, name -> Axes
+        lines: dict, name -> list of Line2D, updated in place by visualize
+        colorbars: dict, name -> Colorbar, filled by visualize on the first call
+    """
+    if PLOT_DIR not in _figures:
+        fig = plt.figure(figsize=(12, 8), facecolor='white')
+        names = ['traj', 'phase', 'vecfield', 'vec_error_abs', 'vec_error_rel', 'energy']
+        axes = {name: fig.add_subplot(231 + i, frameon=False) for i, name in enumerate(names)}
+        lines = {}
+
+        _format_axis(axes['traj'], 'Trajectories', 't', 'x,y', xlim=(0, 10))
+        lines['traj'] = (axes['traj'].plot([], [], [], [], 'g-')
+                         + axes['traj'].plot([], [], '--', [], [], 'b--'))
+        axes['traj'].legend()
+
+        _format_axis(axes['phase'], 'Phase Portrait', 'x', 'x_dt')
+        lines['phase'] = (axes['phase'].plot([], [], 'g--') + axes['phase'].plot([], [], 'b--')
+                          + axes['phase'].plot([], [], 'g--') + axes['phase'].plot([], [], 'b--'))
+
+        _format_axis(axes['energy'], 'Total Energy', 't', xlim=None, ylim=None)
+        lines['energy'] = axes['energy'].plot([], [], [], [])
+
+        _format_axis(axes['vecfield'], 'Learned Vector Field', 'x', 'x_dt')
+        _format_axis(axes['vec_error_abs'], 'Abs. error of xdot', 'x', 'x_dt')
+        _format_axis(axes['vec_error_rel'], 'Rel. error of xdot', 'x', 'x_dt')
+        _figures[PLOT_DIR] = (fig, axes, lines, {})
+    return _figures[PLOT_DIR]
+
+
 def visualize(model, x_val, PLOT_DIR, TIME_OF_RUN, args, ode_model=True, latent=False, epoch=0, is_mdn=False):
     """Visualize a tf.keras.Model for a single pendulum.
     # Arguments:
@@ -163,126 +350,102 @@ def visualize(model, x_val, PLOT_DIR, TIME_OF_RUN, args, ode_model=True, latent=
                    or the value of the next step (False)
         args: input arguments from main script
     """
-    x_val = x_val.reshape(2, -1, 2)
+    x_val = np.asarray(x_val).reshape(2, -1, 2)
+    if x_val.dtype == np.float16:  # half-precision datasets, see create_dataset
+        x_val = x_val.astype(np.float32)
     dt = 0.01
-    t = tf.linspace(0., 10., int(10./dt)+1)
+    steps = 61
+    t, x, y, grid, grid_var = _visualization_grids(dt, steps)
     # Compute the predicted trajectories
     if ode_model:
-        x0_extrap = tf.stack([x_val[0, 0]])
-        x_t_extrap = odeint(model, x0_extrap, t, rtol=1e-5, atol=1e-5).numpy()[:, 0]
-        x0_interp = tf.stack([x_val[1, 0]])
-        x_t_interp = odeint(model, x0_interp, t, rtol=1e-5, atol=1e-5).numpy()[:, 0]
+        # Solve both series as one batch, shape (len(t), 2, 2)
+        x0 = tf.stack([x_val[0, 0], x_val[1, 0]])
+        x_t_pred = odeint(model, x0, t, rtol=1e-5, atol=1e-5).numpy()
+        x_t_extrap, x_t_interp = x_t_pred[:, 0], x_t_pred[:, 1]
     else:  # LSTM model
         x_t_extrap = np.zeros_like(x_val[0])
         x_t_extrap[0] = x_val[0, 0]
         x_t_interp = np.zeros_like(x_val[1])
         x_t_interp[0] = x_val[1, 0]
-        # Always injects the entire time series because keras is slow when using
-        # varying series lengths and the future timesteps don't affect the predictions
-        # before it anyways.
         if is_mdn:
             import mdn
+            # Step the LSTM cell one timestep at a time and carry its state along,
+            # instead of re-feeding the whole prefix to the model at every step.
+            lstm, dense, mdn_layer = model.model.layers[:3]
+            state = lstm.cell.get_initial_state(batch_size=2, dtype=tf.float32)
             for i in range(1, len(t)):
-                pred_extrap = model(0., np.expand_dims(x_t_extrap, axis=0))[0, i-1:i]
-                x_t_extrap[i:i+1] = mdn.sample_from_output(pred_extrap.numpy()[0], 2, 5, temp=1.)
-                pred_interp = model(0., np.expand_dims(x_t_interp, axis=0))[0, i-1:i]
-                x_t_interp[i:i+1] = mdn.sample_from_output(pred_interp.numpy()[0], 2, 5, temp=1.)
+                h, state = lstm.cell(np.stack([x_t_extrap[i-1], x_t_interp[i-1]]), state)
+                pred = mdn_layer(dense(h)).numpy()
+                x_t_extrap[i:i+1] = mdn.sample_from_output(pred[0], 2, 5, temp=1.)
+                x_t_interp[i:i+1] = mdn.sample_from_output(pred[1], 2, 5, temp=1.)
         else:
-            for i in range(1, len(t)):
-                x_t_extrap[i:i+1] = model(0., np.expand_dims(x_t_extrap, axis=0))[0, i-1:i]
-                x_t_interp[i:i+1] = model(0., np.expand_dims(x_t_interp, axis=0))[0, i-1:i]
+            rollout = _jitted_lstm_rollout()
+            lstm, dense = model.model.layers[:2]
+            weights = [np.ascontiguousarray(w, dtype=np.float32)
+                       for w in lstm.get_weights() + dense.get_weights()]
+            x_t_extrap = rollout(x_t_extrap[0], *weights, len(t)).astype(x_val.dtype)
+            x_t_interp = rollout(x_t_interp[0], *weights, len(t)).astype(x_val.dtype)
 
     x_t = np.stack([x_t_extrap, x_t_interp], axis=0)
-    # Plot the generated trajectories
-    fig = plt.figure(figsize=(12, 8), facecolor='white')
-    ax_traj = fig.add_subplot(231, frameon=False)
-    ax_phase = fig.add_subplot(232, frameon=False)
-    ax_vecfield = fig.add_subplot(233, frameon=False)
-    ax_vec_error_abs = fig.add_subplot(234, frameon=False)
-    ax_vec_error_rel = fig.add_subplot(235, frameon=False)
-    ax_energy = fig.add_subplot(236, frameon=False)
-    ax_traj.cla()
-    ax_traj.set_title('Trajectories')
-    ax_traj.set_xlabel('t')
-    ax_traj.set_ylabel('x,y')
-    ax_traj.plot(t.numpy(), x_val[0, :, 0], t.numpy(), x_val[0, :, 1], 'g-')
-    ax_traj.plot(t.numpy(), x_t[0, :, 0], '--', t.numpy(), x_t[0, :, 1], 'b--')
-    ax_traj.set_xlim(min(t.numpy()), max(t.numpy()))
-    ax_traj.set_ylim(-6, 6)
-    ax_traj.legend()
-
-    ax_phase.cla()
-    ax_phase.set_title('Phase Portrait')
-    ax_phase.set_xlabel('x')
-    ax_phase.set_ylabel('x_dt')
-    ax_phase.plot(x_val[0, :, 0], x_val[0, :, 1], 'g--')
-    ax_phase.plot(x_t[0, :, 0], x_t[0, :, 1], 'b--')
-    ax_phase.plot(x_val[1, :, 0], x_val[1, :, 1], 'g--')
-    ax_phase.plot(x_t[1, :, 0], x_t[1, :, 1], 'b--')
-    ax_phase.set_xlim(-6, 6)
-    ax_phase.set_ylim(-6, 6)
-
-    ax_vecfield.cla()
-    ax_vecfield.set_title('Learned Vector Field')
-    ax_vecfield.set_xlabel('x')
-    ax_vecfield.set_ylabel('x_dt')
-
-    steps = 61
-    y, x = np.mgrid[-6:6:complex(0, steps), -6:6:complex(0, steps)]
-    ref_func = Lambda()
-    dydt_ref = ref_func(0., np.stack([x, y], -1).reshape(steps * steps, 2)).numpy()
-    mag_ref = 1e-8+np.linalg.norm(dydt_ref, axis=-1).reshape(steps, steps)
-    dydt_ref = dydt_ref.reshape(steps, steps, 2)
+    dydt_ref, mag_ref = _reference_field(dt, steps)
 
     if ode_model:  # is Dense-Net or NODE-Net or NODE-e2e
-        dydt = model(0., np.stack([x, y], -1).reshape(steps * steps, 2)).numpy()
+        dydt = model(0., grid_var).numpy()
     else:  # is LSTM
         # Compute artificial x_dot by numerically diffentiating:
         # x_dot \approx (x_{t+1}-x_t)/dt
-        yt_1 = model(0., np.stack([x, y], -1).reshape(steps * steps, 1, 2))[:, 0]
+        yt_1 = model(0., tf.reshape(grid_var, (steps * steps, 1, 2)))[:, 0]
         if is_mdn:  # have to sample from output Gaussians
             yt_1 = np.apply_along_axis(mdn.sample_from_output, 1, yt_1.numpy(), 2, 5, temp=.1)[:,0]
-        dydt = (np.array(yt_1)-np.stack([x, y], -1).reshape(steps * steps, 2)) / dt
+        dydt = (np.array(yt_1)-grid) / dt
 
+    mag = np.hypot(dydt[:, 0], dydt[:, 1])[:, None]
     dydt_abs = dydt.reshape(steps, steps, 2)
-    dydt_unit = dydt_abs / np.linalg.norm(dydt_abs, axis=-1, keepdims=True)  # make unit vector
-
-    ax_vecfield.streamplot(x, y, dydt_unit[:, :, 0], dydt_unit[:, :, 1], color="black")
-    ax_vecfield.set_xlim(-6, 6)
-    ax_vecfield.set_ylim(-6, 6)
-
-    ax_vec_error_abs.cla()
-    ax_vec_error_abs.set_title('Abs. error of xdot')
-    ax_vec_error_abs.set_xlabel('x')
-    ax_vec_error_abs.set_ylabel('x_dt')
-
-    abs_dif = np.clip(np.linalg.norm(dydt_abs-dydt_ref, axis=-1), 0., 3.)
-    c1 = ax_vec_error_abs.contourf(x, y, abs_dif, 100)
-    plt.colorbar(c1, ax=ax_vec_error_abs)
-
-    ax_vec_error_abs.set_xlim(-6, 6)
-    ax_vec_error_abs.set_ylim(-6, 6)
-
-    ax_vec_error_rel.cla()
-    ax_vec_error_rel.set_title('Rel. error of xdot')
-    ax_vec_error_rel.set_xlabel('x')
-    ax_vec_error_rel.set_ylabel('x_dt')
+    dydt_unit = np.divide(dydt, np.maximum(mag, 1e-8)).reshape(steps, steps, 2)  # make unit vector
 
+    dydt_dif = dydt_abs - dydt_ref
+    abs_dif = np.clip(np.hypot(dydt_dif[..., 0], dydt_dif[..., 1]), 0., 3.)
     rel_dif = np.clip(abs_dif / mag_ref, 0., 1.)
-    c2 = ax_vec_error_rel.contourf(x, y, rel_dif, 100)
-    plt.colorbar(c2, ax=ax_vec_error_rel)
 
-    ax_vec_error_rel.set_xlim(-6, 6)
-    ax_vec_error_rel.set_ylim(-6, 6)
+    # Plot the generated trajectories
+    fig, axes, lines, colorbars = _get_figure(PLOT_DIR)
+    t_np = t.numpy()
+    lines['traj'][0].set_data(t_np, x_val[0, :, 0])
+    lines['traj'][1].set_data(t_np, x_val[0, :, 1])
+    lines['traj'][2].set_data(t_np, x_t[0, :, 0])
+    lines['traj'][3].set_data(t_np, x_t[0, :, 1])
+
+    lines['phase'][0].set_data(x_val[0, :, 0], x_val[0, :, 1])
+    lines['phase'][1].set_data(x_t[0, :, 0], x_t[0, :, 1])
+    lines['phase'][2].set_data(x_val[1, :, 0], x_val[1, :, 1])
+    lines['phase'][3].set_data(x_t[1, :, 0], x_t[1, :, 1])
+
+    # Streamplots cannot be updated in place, so only this axis is redrawn
+    ax_vecfield = axes['vecfield']
+    ax_vecfield.cla()
+    _format_axis(ax_vecfield, 'Learned Vector Field', 'x', 'x_dt')
+    ax_vecfield.streamplot(x, y, dydt_unit[:, :, 0], dydt_unit[:, :, 1], color="black")
 
-    ax_energy.cla()
-    ax_energy.set_title('Total Energy')
-    ax_energy.set_xlabel('t')
-    ax_energy.plot(np.arange(1001)/100.1, np.array([total_energy(x_) for x_ in x_t_interp]))
+    # Fixed levels over the clipping range, so the colorbars drawn on the first
+    # call stay valid for every later contour
+    for name, title, dif, levels in [
+            ('vec_error_abs', 'Abs. error of xdot', abs_dif, np.linspace(0., 3., 21)),
+            ('vec_error_rel', 'Rel. error of xdot', rel_dif, np.linspace(0., 1., 21))]:
+        ax = axes[name]
+        ax.cla()
+        _format_axis(ax, title, 'x', 'x_dt')
+        contour = ax.contourf(x, y, dif, levels)
+        if name not in colorbars:
+            colorbars[name] = fig.colorbar(contour, ax=ax)
+
+    energy = total_energy(x_t)  # shape (2, len(t)), extrapolation first
+    lines['energy'][0].set_data(t_np, energy[1])
+    lines['energy'][1].set_data(t_np, energy[0])
+    axes['energy'].relim()
+    axes['energy'].autoscale_view()
 
     fig.tight_layout()
-    plt.savefig(PLOT_DIR + '/{:03d}'.format(epoch))
-    plt.close()
+    fig.savefig(PLOT_DIR + '/{:03d}'.format(epoch))
 
     # Compute Metrics
     energy_drift_extrap = relative_energy_drift(x_t[0], x_val[0])
@@ -295,7 +458,7 @@ def visualize(model, x_val, PLOT_DIR, TIME_OF_RUN, args, ode_model=True, latent=
 
 
     wall_time = (datetime.datetime.now()
-                 - datetime.datetime.strptime(TIME_OF_RUN, "%Y%m%d-%H%M%S")).total_seconds()
+                 - _parse_run_time(TIME_OF_RUN)).total_seconds()
     string = "{},{},{},{},{},{},{},{}\n".format(wall_time, epoch,
                                                 energy_drift_interp, energy_drift_extrap,
                                                 phase_error_interp, phase_error_extrap,
@@ -303,15 +466,7 @@ def visualize(model, x_val, PLOT_DIR, TIME_OF_RUN, args, ode_model=True, latent=
     file_path = (PLOT_DIR + TIME_OF_RUN + "results"
                  + str(args.lr) + str(args.dataset_size) + str(args.batch_size)
                  + ".csv")
-    if not os.path.isfile(file_path):
-        title_string = ("wall_time,epoch,energy_drift_interp,energy_drift_extrap, phase_error_interp,"
-                        + "phase_error_extrap, traj_err_interp, traj_err_extrap\n")
-        fd = open(file_path, 'a')
-        fd.write(title_string)
-        fd.close()
-    fd = open(file_path, 'a')
-    fd.write(string)
-    fd.close()
+    _get_csv_handle(file_path).write(string)
 
     # Print Jacobian
     if ode_model:
@@ -334,5 +489,8 @@ def visualize(model, x_val, PLOT_DIR, TIME_OF_RUN, args, ode_model=True, latent=
 
 
 def zero_crossings(x):
-    """Find indices of zeros crossings"""
-    return np.array(np.where(np.diff(np.sign(x)))[0])
+    """Find indices of zeros crossings.
+    Compares the sign bits of neighbouring samples in the input's own dtype: 0.0 counts
+    as positive, -0.0 as negative, and NaNs are classified by their sign bit."""
+    sign = np.signbit(x)
+    return np.flatnonzero(sign[1:] != sign[:-1])
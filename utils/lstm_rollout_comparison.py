@@ -0,0 +1,39 @@
+"""
+Compare the numba LSTM rollout used by the mass-spring-damper visualize function
+with an autoregressive rollout of the equivalent Keras LSTM + Dense model.
+Run from the main directory:
+python3 utils/lstm_rollout_comparison.py
+"""
+import sys
+sys.path.insert(0, 'experiments/mass_spring_damper')
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.layers import Dense, LSTM
+from tensorflow.keras.models import Sequential
+from utils import _jitted_lstm_rollout
+
+np.random.seed(0)
+tf.random.set_seed(0)
+n_steps = 20
+
+model = Sequential()
+model.add(LSTM(8, return_sequences=True, input_shape=(None, 2)))
+model.add(Dense(2))
+
+x0 = np.random.uniform(-1, 1, 2).astype(np.float32)
+
+# Reference: feed the whole prefix through the Keras model at every step
+x_keras = np.zeros((n_steps, 2), dtype=np.float32)
+x_keras[0] = x0
+for i in range(1, n_steps):
+    x_keras[i] = model(x_keras[None, :i])[0, -1]
+
+lstm, dense = model.layers
+weights = [np.ascontiguousarray(w, dtype=np.float32)
+           for w in lstm.get_weights() + dense.get_weights()]
+x_numba = _jitted_lstm_rollout()(x0, *weights, n_steps)
+
+max_error = np.max(np.abs(x_numba - x_keras))
+print('Max. abs. difference over {} steps: {}'.format(n_steps, max_error))
+assert max_error < 1e-5, 'numba rollout does not match the Keras model'